@@ -3,9 +3,9 @@
 # bencode_stream is a library for parsing bencoded data in a streaming fashion,
 # meant for handling large torrent files on memory-constrained platforms.
 
-import enum, attr
+import enum, attr, hashlib
 
-from typing import List, Optional, Tuple
+from typing import List, NoReturn, Optional, Tuple, Union
 
 class DataType(enum.Enum):
     INT = 0
@@ -14,12 +14,89 @@ class DataType(enum.Enum):
     DICT = 3
     END = 4
 
+# the parser works with the DataType values as plain ints internally, since
+# those are much cheaper to compare than enum members
+_INT, _BYTES, _LIST, _DICT, _END = (t.value for t in DataType)
+
+# byte values of the bencode syntax characters
+_I = 0x69 # 'i'
+_D = 0x64 # 'd'
+_L = 0x6c # 'l'
+_E = 0x65 # 'e'
+_COLON = 0x3a # ':'
+_ZERO = 0x30 # '0'
+_NINE = 0x39 # '9'
+
+# the bytes allowed in the digits of an int and a bytestring length, as
+# deletion sets for bytes.translate()
+_INT_CHARS = b'-0123456789'
+_DIGITS = b'0123456789'
+
+# lookup table marking the digit bytes, indexed by byte value
+_DIGIT_TBL = bytes(1 if _ZERO <= c <= _NINE else 0 for c in range(256))
+
+# maps the first byte of an encoded object to the type of that object
+_DISPATCH: List[Optional[int]] = [None] * 256
+_DISPATCH[_I] = _INT
+_DISPATCH[_D] = _DICT
+_DISPATCH[_L] = _LIST
+_DISPATCH[_E] = _END
+for _c in range(_ZERO, _NINE + 1):
+    _DISPATCH[_c] = _BYTES
+del _c
+
+# bitmasks of the types the parser can expect next, with bit N set for the
+# DataType of value N: any object (top level, dict value), any object or end
+# (list), and a key or end (dict key)
+_M_ALL = (1 << _INT) | (1 << _BYTES) | (1 << _LIST) | (1 << _DICT)
+_M_ALL_END = _M_ALL | (1 << _END)
+_M_KEY = (1 << _BYTES) | (1 << _END)
+
+# the parser's state stacks are allocated in blocks of this many entries
+_STACK_BLOCK = 64
+
+# sentinel return values for the scanners below
+_SCAN_MORE = -1
+_SCAN_INVALID = -2
+
+def _scan_int_end(buf: Union[bytes, bytearray], start: int) -> int:
+    """Returns the index of the 'e' ending an int whose digits begin at start.
+    Returns _SCAN_MORE if the buffer ends first, or _SCAN_INVALID if a byte
+    that can't be part of an int is found.
+
+    """
+    # find() and translate() do the scanning in C, rather than looping over
+    # the bytes here
+    end = buf.find(_E, start)
+    stop = len(buf) if end == -1 else end
+    if buf[start:stop].translate(None, _INT_CHARS):
+        return _SCAN_INVALID
+    return _SCAN_MORE if end == -1 else end
+
+def _scan_len_end(buf: Union[bytes, bytearray], start: int) -> int:
+    """Returns the index of the ':' ending a bytestring length prefix which begins
+    at start. Return values are as for _scan_int_end().
+
+    """
+    end = buf.find(_COLON, start)
+    stop = len(buf) if end == -1 else end
+    if buf[start:stop].translate(None, _DIGITS):
+        return _SCAN_INVALID
+    return _SCAN_MORE if end == -1 else end
+
 class DecodeError(Exception):
     pass
 
-@attr.s(auto_attribs=True)
+class _ParseAbort(Exception):
+    """Raised to unwind parse_bytes() after an error has been reported to
+    handle_error(), in case that didn't raise.
+
+    """
+    pass
+
+@attr.s(auto_attribs=True, slots=True)
 class DictParseState:
-    latest_key: Optional[bytes] = None
+    latest_key: Optional[bytearray] = None
     expect_key: bool = True
 
 class StreamingDecoder:
@@ -63,7 +140,12 @@ class StreamingDecoder:
     def handle_bytes_start(self, blen: int) -> None:
         pass
 
-    def handle_bytes_data(self, data: bytes) -> None:
+    def handle_bytes_data(self, data: memoryview) -> None:
+        """data is a view into the parser's internal buffer, and is released as
+        soon as this returns; implementations that need to keep the data must
+        copy it out (e.g. with bytes(data)).
+
+        """
         pass
 
     def handle_bytes_end(self) -> None:
@@ -77,14 +159,23 @@ class StreamingDecoder:
         raise DecodeError(emsg)
 
     def __init__(self) -> None:
-        # this is a stack representing the current parse state
-        self._now_inside: List[DataType] = []
+        # this is a stack representing the current parse state: entry N is the
+        # DataType value of the object at nesting depth N, and only the first
+        # _depth entries are in use. it's preallocated and grown in blocks, so
+        # entering and leaving objects doesn't allocate
+        self._now_inside = bytearray(_STACK_BLOCK)
+        self._depth = 0
         # this has the byte offset of current parsing
         self._byte_offset: int = 0
         # this is a stack of parse states for each dict we're in -- note it
-        # only has entries for dicts, so it will usually be shorter than
+        # only has entries for dicts, so it will usually be shallower than
         # _now_inside
         self._dicts: List[DictParseState] = []
+        # the bitmask of types the parser can currently expect (see _M_ALL
+        # etc.); entry N of _mask_stack is the mask to restore when the list
+        # or dict at depth N ends
+        self._allowed_mask = _M_ALL
+        self._mask_stack = bytearray(_STACK_BLOCK)
 
         # if an error is encountered, this is set: afterward, the parser cannot
         # parse any more
@@ -94,231 +185,427 @@ class StreamingDecoder:
         self._finished = False
 
         # buffer for incomplete data -- this will only hold the middle part of
-        # int parses, anything else gets represented in the parse state
-        self._buf = b""
-
-        self._cur_dict_key: Optional[bytes] = None
-
-        self._bytes_expect_len: Optional[int] = None
-        self._bytes_parsed_len: Optional[int] = None
-
-    def _can_expect(self) -> Tuple[DataType, ...]:
-        # this function returns which types the parser can currently expect
-
-        ALL_TYPES = (DataType.INT, DataType.BYTES, DataType.LIST,
-                     DataType.DICT)
-        # at the top level, we can parse any object but only one
-        if len(self._now_inside) == 0:
-            return ALL_TYPES
-
-        # list can include any data type
-        if self._now_inside[-1] == DataType.LIST:
-            return (ALL_TYPES + (DataType.END,))
-
-        if self._now_inside[-1] == DataType.DICT:
-            curstate = self._dicts[-1]
-            # if we need a key, it must be bytes
-            if curstate.expect_key:
-                return (DataType.BYTES, DataType.END)
-            else:
-                return ALL_TYPES
-
-        # this exhausts all valid cases (can't be inside an int, if we're
-        # inside a bytes then we don't use this method)
-        raise ValueError("incorrect _now_inside tip value")
-
-    def _check_dict_key(self) -> None:
-        """This toggles the expect_key setting for the current dict, if the parser is
-        currently directly under a dict. Should be called every time an object
-        finished parsing.
-
-        """
-        if len(self._now_inside) == 0:
-            self._finished = True
-            return
-
-        if self._now_inside[-1] == DataType.DICT:
-            cv = self._dicts[-1]
-            cv.expect_key = not cv.expect_key
-            if not cv.expect_key:
-                assert self._cur_dict_key is not None
-
-                if (cv.latest_key is not None and
-                    not self._cur_dict_key > cv.latest_key):
-                    self._error = True
-                    self.handle_error(f"invalid key ordering on key "
-                                      f"{self._cur_dict_key.decode()!r}")
-                    return
-
-                cv.latest_key = self._cur_dict_key
-            else:
-                self.handle_dict_value_end()
-        elif self._now_inside[-1] == DataType.LIST:
-            self.handle_list_value_end()
-
-    def _check_handle_dict(self, ctype: DataType) -> None:
-        """This checks whether we're currently parsing a dict, and if so calls the
-        appropriate handle_dict_key or handle_dict_value methods. It should be
-        called before parsing any object.
+        # int parses, anything else gets represented in the parse state. while
+        # parsing, _pos is the index of the first unconsumed byte; the buffer
+        # is only compacted when parse_data() returns
+        self._buf = bytearray()
+        self._pos = 0
+
+        # accumulates the dict key currently being parsed, reused for every
+        # key; _in_dict_key is set while the bytestring being parsed is a dict
+        # key
+        self._cur_dict_key = bytearray()
+        self._in_dict_key = False
+
+        # bytestring data is the bulk of most documents, so if the subclass
+        # doesn't override handle_bytes_data() we skip it entirely rather than
+        # making a memoryview for every chunk just to call a noop
+        self._wants_bytes_data = (type(self).handle_bytes_data is not
+                                  StreamingDecoder.handle_bytes_data)
+
+        # the SHA-1 hash of the value of the top-level dict's "info" key (i.e.
+        # the infohash of a torrent file), computed from the raw data as it
+        # goes past. _info_next is set when that value is the next object;
+        # while it's being parsed, _info_sha1 is the running hash, which has
+        # been fed the buffer up to _info_start
+        self._info_next = False
+        self._info_sha1: Optional["hashlib._Hash"] = None
+        self._info_start = 0
+        self._info_hash: Optional[bytes] = None
+
+        # length of the bytestring being parsed, and how much of it we've seen
+        # so far; only meaningful while a bytestring is on top of the stack
+        self._bytes_expect_len = 0
+        self._bytes_parsed_len = 0
+
+    def _grow_stacks(self) -> None:
+        self._now_inside.extend(bytes(_STACK_BLOCK))
+        self._mask_stack.extend(bytes(_STACK_BLOCK))
+
+    def parse_data(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        """Feeds data to the parser. data may be any bytes-like object, including a
+        memoryview; its contents are copied into the parser's buffer, so the
+        caller is free to reuse the underlying memory once this returns.
 
         """
-        if (len(self._now_inside) == 0 or
-            ctype == DataType.END):
-            return
-
-        if self._now_inside[-1] == DataType.DICT:
-            if self._dicts[-1].expect_key:
-                self.handle_dict_key_start()
-                self._cur_dict_key = b""
-            else:
-                self.handle_dict_value_start()
-                self._cur_dict_key = None
-        elif self._now_inside[-1] == DataType.LIST:
-            self.handle_list_value_start()
-
-    def _dict_key_data(self, s: bytes) -> None:
-        if self._cur_dict_key is not None:
-            self._cur_dict_key += s
-
-    def parse_data(self, data: bytes) -> None:
         if self._error:
             raise DecodeError("parser in error state, cannot continue")
         if self._finished:
             raise DecodeError("parser finished with top-level object, "
                               "cannot continue")
 
-        self._buf += data
+        self._buf.extend(data)
         del data
 
-        while True:
-            if (len(self._now_inside) > 0 and
-                self._now_inside[-1] == DataType.BYTES):
-                assert self._bytes_expect_len is not None
-                assert self._bytes_parsed_len is not None
-
-                rem_bytes = self._bytes_expect_len - self._bytes_parsed_len
-                th, self._buf = self._buf[:rem_bytes], self._buf[rem_bytes:]
-                parsed_len = len(th)
-                self.handle_bytes_data(th)
-                self._dict_key_data(th)
-                del th
-
-                self._bytes_parsed_len += parsed_len
-                self._byte_offset += parsed_len
-                if self._bytes_parsed_len >= self._bytes_expect_len:
-                    self._bytes_parsed_len = None
-                    self._bytes_expect_len = None
-                    self._now_inside.pop()
-                    self.handle_bytes_end()
-                    self._check_dict_key()
-                    if self._cur_dict_key is not None:
-                        self.handle_dict_key_end(self._cur_dict_key)
-                    if len(self._buf) == 0:
-                        break
-                else:
-                    # in this case, we consumed all available data and are
-                    # still in the string; just break out of the parse loop and
-                    # return to wait for more data
-                    break
-
-            good_types = self._can_expect()
+        try:
+            self._parse_buf()
+        finally:
+            # hash whatever part of the info value we've consumed before it's
+            # dropped from the buffer
+            if self._info_sha1 is not None:
+                with memoryview(self._buf)[self._info_start:self._pos] as mv:
+                    self._info_sha1.update(mv)
+                self._info_start = 0
+
+            # drop everything we've consumed; what's left is only the
+            # incomplete prefix of an int or bytestring length
+            del self._buf[:self._pos]
+            self._pos = 0
+
+    def _parse_buf(self) -> None:
+        """This parses as much of the buffered data as possible, advancing
+        self._pos past everything consumed. It never slices the buffer itself;
+        compaction is left to parse_data().
 
-            if len(self._buf) == 0:
-                break
+        """
+        # the buffer and stacks are only ever mutated in place, and the
+        # handlers can't change during a parse, so look them up only once
+        buf = self._buf
+        inside = self._now_inside
+        dicts = self._dicts
+        mask_stack = self._mask_stack
+        handle_bytes_data = self.handle_bytes_data
+        wants_bytes_data = self._wants_bytes_data
+        handle_int = self.handle_int
+
+        # the cursor and stack depth are kept in locals while parsing, and
+        # only stored back when we return
+        p = self._pos
+        depth = self._depth
+        try:
+            while True:
+                if depth > 0 and inside[depth - 1] == _BYTES:
+                    rem_bytes = self._bytes_expect_len - self._bytes_parsed_len
+                    take = min(len(buf) - p, rem_bytes)
+                    if wants_bytes_data or self._in_dict_key:
+                        with memoryview(buf)[p:p + take] as th:
+                            if wants_bytes_data:
+                                handle_bytes_data(th)
+                            if self._in_dict_key:
+                                self._cur_dict_key.extend(th)
+                    p += take
+
+                    self._bytes_parsed_len += take
+                    self._byte_offset += take
+                    if self._bytes_parsed_len < self._bytes_expect_len:
+                        # in this case, we consumed all available data and
+                        # are still in the string; just break out of the parse
+                        # loop and return to wait for more data
+                        break
 
-            if self._buf[0] == ord('i'):
-                cur_type = DataType.INT
-            elif self._buf[0] == ord('d'):
-                cur_type = DataType.DICT
-            elif self._buf[0] == ord('l'):
-                cur_type = DataType.LIST
-            elif self._buf[0:1].isdigit():
-                cur_type = DataType.BYTES
-            elif self._buf[0] == ord('e'):
-                cur_type = DataType.END
-
-            if cur_type not in good_types:
-                self._error = True
-                self.handle_error(f"unexpected object type {cur_type}")
-                return
-
-            self._check_handle_dict(cur_type)
-
-            if cur_type == DataType.INT:
-                i = 1
-                while True:
-                    if i >= len(self._buf):
-                        # in this case, the buffer ends mid-int; break out and
-                        # wait for more data
-                        return
-                    elif self._buf[i] == ord('e'):
-                        end_ind = i
+                    depth -= 1
+                    self.handle_bytes_end()
+                else:
+                    if p >= len(buf):
                         break
-                    elif (not self._buf[i:i + 1].isdigit() and
-                          self._buf[i] != ord('-')):
+
+                    cur_type = _DISPATCH[buf[p]]
+                    if cur_type is None:
                         self._error = True
-                        self.handle_error("invalid int")
+                        self.handle_error(f"invalid object start byte "
+                                          f"{bytes(buf[p:p + 1])!r}")
                         return
-                    i += 1
-                num_b = self._buf[1:end_ind]
-                val = int(num_b)
-                self.handle_int(val)
-                self._byte_offset += len(num_b) + 2
-                self._buf = self._buf[end_ind + 1:]
-                self._check_dict_key()
-            elif cur_type == DataType.BYTES:
-                i = 0
-                while True:
-                    if i >= len(self._buf):
-                        # we're mid-int, return and wait for more data
+
+                    if not (self._allowed_mask >> cur_type) & 1:
+                        self._error = True
+                        self.handle_error(f"unexpected object type "
+                                          f"{DataType(cur_type)}")
                         return
-                    elif self._buf[i] == ord(':'):
-                        end_ind = i
-                        break
-                    elif not self._buf[i:i + 1].isdigit():
+
+                    # ints and bytestring lengths may be cut off by the end of
+                    # the buffer, so scan those before announcing the new
+                    # object; otherwise the announcement would be repeated
+                    # when the rest of the data arrives
+                    if cur_type == _INT:
+                        i = _scan_int_end(buf, p + 1)
+                        if i == _SCAN_MORE:
+                            # in this case, the buffer ends mid-int; break out
+                            # and wait for more data
+                            return
+                        elif i == _SCAN_INVALID:
+                            self._error = True
+                            self.handle_error("invalid int")
+                            return
+                    elif cur_type == _BYTES:
+                        i = _scan_len_end(buf, p)
+                        if i == _SCAN_MORE:
+                            # we're mid-int, return and wait for more data
+                            return
+                        elif i == _SCAN_INVALID:
+                            self._error = True
+                            self.handle_error("invalid bytestring length")
+                            return
+
+                    # a new object is starting inside a dict or list
+                    if depth > 0 and cur_type != _END:
+                        if inside[depth - 1] == _DICT:
+                            if dicts[-1].expect_key:
+                                self.handle_dict_key_start()
+                                self._cur_dict_key.clear()
+                                self._in_dict_key = True
+                            else:
+                                self.handle_dict_value_start()
+                                if self._info_next:
+                                    self._info_next = False
+                                    self._info_sha1 = hashlib.sha1()
+                                    self._info_start = p
+                        else:
+                            self.handle_list_value_start()
+
+                    if cur_type == _INT:
+                        if i == p + 2 and _DIGIT_TBL[buf[p + 1]]:
+                            # single-digit ints are very common, skip int()
+                            # for them
+                            val = buf[p + 1] - _ZERO
+                        else:
+                            val = int(buf[p + 1:i])
+                        handle_int(val)
+                        self._byte_offset += i - p + 1
+                        p = i + 1
+                    elif cur_type == _BYTES:
+                        val = int(buf[p:i])
+                        self._bytes_expect_len = val
+                        self._bytes_parsed_len = 0
+                        self._byte_offset += i - p + 1
+                        p = i + 1
+                        if depth == len(inside):
+                            self._grow_stacks()
+                        inside[depth] = _BYTES
+                        depth += 1
+                        self.handle_bytes_start(val)
+                        # jump back and parse bytes data
+                        continue
+                    elif cur_type == _LIST:
+                        if depth == len(inside):
+                            self._grow_stacks()
+                        inside[depth] = _LIST
+                        mask_stack[depth] = self._allowed_mask
+                        depth += 1
+                        self._allowed_mask = _M_ALL_END
+                        self._byte_offset += 1
+                        p += 1
+                        self.handle_list_start()
+                        continue
+                    elif cur_type == _DICT:
+                        if depth == len(inside):
+                            self._grow_stacks()
+                        inside[depth] = _DICT
+                        mask_stack[depth] = self._allowed_mask
+                        depth += 1
+                        self._allowed_mask = _M_KEY
+                        dicts.append(DictParseState())
+                        self._byte_offset += 1
+                        p += 1
+                        self.handle_dict_start()
+                        continue
+                    elif cur_type == _END:
+                        if inside[depth - 1] == _DICT:
+                            depth -= 1
+                            self._allowed_mask = mask_stack[depth]
+                            dicts.pop()
+                            self.handle_dict_end()
+                        elif inside[depth - 1] == _LIST:
+                            depth -= 1
+                            self._allowed_mask = mask_stack[depth]
+                            self.handle_list_end()
+                        else:
+                            self._error = True
+                            self.handle_error("invalid end token")
+                            return
+                        self._byte_offset += 1
+                        p += 1
+
+                # if we get here, an object has just finished parsing; update
+                # the state of whatever contains it
+                if depth == 0:
+                    self._finished = True
+                elif inside[depth - 1] == _DICT:
+                    cv = dicts[-1]
+                    cv.expect_key = not cv.expect_key
+                    if cv.expect_key:
+                        if depth == 1 and self._info_sha1 is not None:
+                            with memoryview(buf)[self._info_start:p] as mv:
+                                self._info_sha1.update(mv)
+                            self._info_hash = self._info_sha1.digest()
+                            self._info_sha1 = None
+                        self._allowed_mask = _M_KEY
+                        self.handle_dict_value_end()
+                        continue
+
+                    self._allowed_mask = _M_ALL
+                    self._in_dict_key = False
+                    key = self._cur_dict_key
+                    if cv.latest_key is None:
+                        cv.latest_key = bytearray(key)
+                    elif key > cv.latest_key:
+                        cv.latest_key[:] = key
+                    else:
                         self._error = True
-                        self.handle_error("invalid bytestring length")
+                        self.handle_error(f"invalid key ordering on key "
+                                          f"{bytes(key)!r}")
                         return
-                    i += 1
-                num_b = self._buf[:end_ind]
-                val = int(num_b)
-                self._bytes_expect_len = val
-                self._bytes_parsed_len = 0
-                self._byte_offset += len(num_b) + 1
-                self._buf = self._buf[end_ind + 1:]
-                self._now_inside.append(DataType.BYTES)
-                self.handle_bytes_start(val)
-                # jump back and parse bytes data
-                continue
-            elif cur_type == DataType.LIST:
-                self._now_inside.append(DataType.LIST)
-                self._byte_offset += 1
-                self._buf = self._buf[1:]
-                self.handle_list_start()
-            elif cur_type == DataType.DICT:
-                self._now_inside.append(DataType.DICT)
-                self._dicts.append(DictParseState())
-                self._byte_offset += 1
-                self._buf = self._buf[1:]
-                self.handle_dict_start()
-            elif cur_type == DataType.END:
-                if self._now_inside[-1] == DataType.DICT:
-                    self._now_inside.pop()
-                    self._dicts.pop()
-                    self.handle_dict_end()
-                elif self._now_inside[-1] == DataType.LIST:
-                    self._now_inside.pop()
-                    self.handle_list_end()
+                    if depth == 1 and key == b"info":
+                        self._info_next = True
+                    self.handle_dict_key_end(bytes(key))
                 else:
-                    self._error = True
-                    self.handle_error("invalid end token")
-                    return
-                self._check_dict_key()
-                self._byte_offset += 1
-                self._buf = self._buf[1:]
+                    self.handle_list_value_end()
+        finally:
+            self._pos = p
+            self._depth = depth
+
+    def get_info_hash(self) -> Optional[bytes]:
+        """Returns the SHA-1 hash of the encoded value of the "info" key in the
+        top-level dict, i.e. the infohash if the document is a torrent file.
+        This is hashed from the raw data as it's parsed, so the data never
+        needs to be re-encoded or kept around. Returns None if there's no such
+        key, or if its value hasn't been completely parsed yet.
+
+        """
+        return self._info_hash
 
     def end_data(self) -> None:
-        if (len(self._now_inside) > 0 or len(self._dicts) > 0 or
+        if (self._depth > 0 or len(self._dicts) > 0 or
             not self._finished):
             self._error = True
             self.handle_error("data ended with unfinished parse")
+
+    def parse_bytes(self, data: Union[bytes, bytearray]) -> None:
+        """Parses a complete bencoded document that's already in memory, calling the
+        same handlers as parse_data() would. This skips the streaming state
+        machine and so is faster, but it needs the whole document at once; use
+        parse_data() for anything large. It can only be used on a fresh
+        decoder, and leaves the decoder finished as if end_data() had been
+        called.
+
+        """
+        if (self._error or self._finished or self._depth > 0 or
+            len(self._buf) > 0):
+            raise DecodeError("parse_bytes() needs a decoder that hasn't "
+                              "parsed any data")
+
+        try:
+            with memoryview(data) as mv:
+                try:
+                    i = self._parse_value(data, mv, 0)
+                except RecursionError:
+                    self._fail(0, "data structures nested too deeply")
+            if i < len(data):
+                self._fail(i, "trailing data after top-level object")
+        except _ParseAbort:
+            return
+
+        self._byte_offset = i
+        self._finished = True
+
+    def _fail(self, i: int, msg: str) -> NoReturn:
+        # reports an error at byte i of the document for parse_bytes()
+        self._byte_offset = i
+        self._error = True
+        self.handle_error(msg)
+        raise _ParseAbort()
+
+    def _fail_start(self, buf: Union[bytes, bytearray], i: int) -> NoReturn:
+        # reports an object that's not allowed to start at byte i
+        if i >= len(buf):
+            self._fail(i, "data ended with unfinished parse")
+        cur_type = _DISPATCH[buf[i]]
+        if cur_type is None:
+            self._fail(i, f"invalid object start byte {bytes(buf[i:i + 1])!r}")
+        self._fail(i, f"unexpected object type {DataType(cur_type)}")
+
+    def _parse_value(self, buf: Union[bytes, bytearray], mv: memoryview,
+                     i: int) -> int:
+        """Parses the object starting at byte i of buf for parse_bytes(), and
+        returns the index just past its end. mv is a memoryview of buf, used to
+        pass bytestring data to handle_bytes_data().
+
+        """
+        if i >= len(buf):
+            self._fail(i, "data ended with unfinished parse")
+        c = buf[i]
+
+        if c == _I:
+            e = _scan_int_end(buf, i + 1)
+            if e == _SCAN_MORE:
+                self._fail(i, "data ended with unfinished parse")
+            elif e == _SCAN_INVALID:
+                self._fail(i, "invalid int")
+            self.handle_int(int(buf[i + 1:e]))
+            return e + 1
+        elif _DIGIT_TBL[c]:
+            return self._parse_bytestring(buf, mv, i)[1]
+        elif c == _L:
+            return self._parse_list(buf, mv, i)
+        elif c == _D:
+            return self._parse_dict(buf, mv, i)
+
+        self._fail_start(buf, i)
+
+    def _parse_bytestring(self, buf: Union[bytes, bytearray], mv: memoryview,
+                          i: int) -> Tuple[int, int]:
+        # returns the start and end indices of the bytestring's contents
+        e = _scan_len_end(buf, i)
+        if e == _SCAN_MORE:
+            self._fail(i, "data ended with unfinished parse")
+        elif e == _SCAN_INVALID:
+            self._fail(i, "invalid bytestring length")
+        blen = int(buf[i:e])
+        start = e + 1
+        end = start + blen
+        self.handle_bytes_start(blen)
+        if end > len(buf):
+            self._fail(start, "data ended with unfinished parse")
+        if self._wants_bytes_data:
+            with mv[start:end] as th:
+                self.handle_bytes_data(th)
+        self.handle_bytes_end()
+        return start, end
+
+    def _parse_list(self, buf: Union[bytes, bytearray], mv: memoryview,
+                    i: int) -> int:
+        self.handle_list_start()
+        i += 1
+        while True:
+            if i >= len(buf):
+                self._fail(i, "data ended with unfinished parse")
+            if buf[i] == _E:
+                break
+            self.handle_list_value_start()
+            i = self._parse_value(buf, mv, i)
+            self.handle_list_value_end()
+        self.handle_list_end()
+        return i + 1
+
+    def _parse_dict(self, buf: Union[bytes, bytearray], mv: memoryview,
+                    i: int) -> int:
+        # the document starts at index 0, so that's the only place the
+        # top-level dict can be
+        top_level = i == 0
+        self.handle_dict_start()
+        i += 1
+        prev_key: Optional[bytes] = None
+        while True:
+            if i >= len(buf):
+                self._fail(i, "data ended with unfinished parse")
+            c = buf[i]
+            if c == _E:
+                break
+            elif not _DIGIT_TBL[c]:
+                self._fail_start(buf, i)
+
+            self.handle_dict_key_start()
+            start, i = self._parse_bytestring(buf, mv, i)
+            key = bytes(buf[start:i])
+            if prev_key is not None and not key > prev_key:
+                self._fail(i, f"invalid key ordering on key {key!r}")
+            prev_key = key
+            self.handle_dict_key_end(key)
+
+            self.handle_dict_value_start()
+            value_start = i
+            i = self._parse_value(buf, mv, i)
+            if top_level and key == b"info":
+                self._info_hash = hashlib.sha1(mv[value_start:i]).digest()
+            self.handle_dict_value_end()
+        self.handle_dict_end()
+        return i + 1
@@ -1,14 +1,27 @@
 #!python3
 
-import click, json
+import click, json, sys
 from base64 import b64encode
 
 from . import stream
 
-from typing import IO, Optional
+from typing import IO, List
 
 def parse_file(dec: stream.StreamingDecoder, inp: IO,
                chunk_size: int = 1024) -> None:
+    if hasattr(inp, 'readinto'):
+        # binary file: read every chunk into the same buffer, rather than
+        # allocating a new bytes object each time
+        buf = bytearray(chunk_size)
+        mv = memoryview(buf)
+        while True:
+            n = inp.readinto(mv)
+            if not n:
+                break
+            dec.parse_data(mv[:n])
+        dec.end_data()
+        return
+
     while True:
         data = inp.read(chunk_size)
         if len(data) == 0:
@@ -18,115 +31,148 @@ def parse_file(dec: stream.StreamingDecoder, inp: IO,
         dec.parse_data(data)
     dec.end_data()
 
-class PrintingDecoder(stream.StreamingDecoder):
+class BufferedOutputDecoder(stream.StreamingDecoder):
+    """Base class for the decoders below, which write their output to stdout.
+    Output is collected with write() and sent to stdout in large batches,
+    rather than with a print() call per handler.
+
+    """
+
+    # number of pending writes to collect before flushing
+    flush_parts = 4096
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.out = sys.stdout.buffer
+        self.parts: List[bytes] = []
+
+    def write(self, b: bytes) -> None:
+        self.parts.append(b)
+        if len(self.parts) > self.flush_parts:
+            self.flush()
+
+    def flush(self) -> None:
+        self.out.write(b"".join(self.parts))
+        self.out.flush()
+        self.parts.clear()
+
+    def handle_error(self, msg: str) -> None:
+        # make sure everything before the error is shown
+        self.flush()
+        super().handle_error(msg)
+
+    def end_data(self) -> None:
+        self.flush()
+        super().end_data()
+
+class PrintingDecoder(BufferedOutputDecoder):
     def handle_dict_start(self) -> None:
-        print("handle_dict_start")
+        self.write(b"handle_dict_start\n")
 
     def handle_dict_key_start(self) -> None:
-        print("handle_dict_key_start")
+        self.write(b"handle_dict_key_start\n")
 
     def handle_dict_key_end(self, key: bytes) -> None:
-        print(f"handle_dict_key_end: {key!r}")
+        self.write(b"handle_dict_key_end: %r\n" % key)
 
     def handle_dict_value_start(self) -> None:
-        print("handle_dict_value_start")
+        self.write(b"handle_dict_value_start\n")
 
     def handle_dict_value_end(self) -> None:
-        print("handle_dict_value_end")
+        self.write(b"handle_dict_value_end\n")
 
     def handle_dict_end(self) -> None:
-        print("handle_dict_end")
+        self.write(b"handle_dict_end\n")
 
     def handle_list_start(self) -> None:
-        print("handle_list_start")
+        self.write(b"handle_list_start\n")
 
     def handle_list_value_start(self) -> None:
-        print("handle_list_value_start")
+        self.write(b"handle_list_value_start\n")
 
     def handle_list_value_end(self) -> None:
-        print("handle_list_value_end")
+        self.write(b"handle_list_value_end\n")
 
     def handle_list_end(self) -> None:
-        print("handle_list_end")
+        self.write(b"handle_list_end\n")
 
     def handle_bytes_start(self, blen: int) -> None:
-        print(f"handle_bytes_start: {blen}")
+        self.write(b"handle_bytes_start: %d\n" % blen)
 
-    def handle_bytes_data(self, data: bytes) -> None:
-        print(f"handle_bytes_data: {data!r}")
+    def handle_bytes_data(self, data: memoryview) -> None:
+        self.write(b"handle_bytes_data: %r\n" % bytes(data))
 
     def handle_bytes_end(self) -> None:
-        print("handle_bytes_end")
+        self.write(b"handle_bytes_end\n")
 
     def handle_int(self, val: int) -> None:
-        print(f"handle_int: {val}")
+        self.write(b"handle_int: %d\n" % val)
 
-class ToJSONDecoder(stream.StreamingDecoder):
+class ToJSONDecoder(BufferedOutputDecoder):
     def __init__(self) -> None:
         super().__init__()
 
-        self.bytes_accum: Optional[bytes] = None
+        self.bytes_accum = bytearray()
         self.in_dict_key = False
         self.first_key = True
 
     def handle_dict_start(self) -> None:
-        print("{", end='')
+        self.write(b"{")
         self.first_key = True
 
     def handle_dict_key_start(self) -> None:
         self.in_dict_key = True
         if not self.first_key:
-            print(", ", end='')
+            self.write(b", ")
         self.first_key = False
 
     def handle_dict_key_end(self, key: bytes) -> None:
         self.in_dict_key = False
-        print(": ", end='')
+        self.write(b": ")
 
     def handle_dict_end(self) -> None:
-        print("}", end='')
+        self.write(b"}")
 
     def handle_list_start(self) -> None:
-        print("[", end='')
+        self.write(b"[")
         self.first_key = True
 
     def handle_list_value_start(self) -> None:
         if not self.first_key:
-            print(", ", end='')
+            self.write(b", ")
         self.first_key = False
 
     def handle_list_end(self) -> None:
-        print("]", end='')
-
-    def handle_bytes_start(self, l: int) -> None:
-        self.bytes_accum = b""
+        self.write(b"]")
 
-    def handle_bytes_data(self, data: bytes) -> None:
-        assert self.bytes_accum is not None
-        self.bytes_accum += data
+    def handle_bytes_data(self, data: memoryview) -> None:
+        self.bytes_accum.extend(data)
 
     def handle_bytes_end(self) -> None:
-        assert self.bytes_accum is not None
         try:
             s = self.bytes_accum.decode('ascii')
         except UnicodeDecodeError:
             if self.in_dict_key:
                 raise ValueError("no base64 dict key")
             s = 'base64:' + b64encode(self.bytes_accum).decode('ascii')
-        print(json.dumps(s), end='')
-        self.bytes_accum = None
+        self.write(json.dumps(s).encode('ascii'))
+        self.bytes_accum = bytearray()
 
     def handle_int(self, val: int) -> None:
-        print(val, end='')
+        self.write(b"%d" % val)
 
 @click.command()
 @click.argument('inp', type=click.Path(exists=True))
 @click.option('--json/--no-json')
 def bencode_test(inp: str, json: bool) -> None:
-    dec: stream.StreamingDecoder
+    dec: BufferedOutputDecoder
     if json:
         dec = ToJSONDecoder()
     else:
         dec = PrintingDecoder()
     with open(inp, 'rb') as infile:
-        parse_file(dec, infile)
+        try:
+            parse_file(dec, infile)
+        finally:
+            dec.flush()